@@ -1,4 +1,5 @@
 import sys
+import atexit
 import json
 import re
 import logging
@@ -11,6 +12,8 @@ import os
 import copy
 import math
 import random
+import platform
+import warnings
 
 try:
     import colorama
@@ -19,10 +22,47 @@ try:
 except ImportError:
     colorama = None
 
-from typing import Any, Dict, List, Optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # 불러오기만 하면 input()이 줄 편집과 기록을 쓰게 되므로(대화형 모드), 이름 자체는 쓰지 않습니다.
+    import readline as _readline  # noqa: F401
+except ImportError:
+    _readline = None
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from collections import ChainMap
+from enum import IntEnum
+from functools import lru_cache
 
-AST_CACHE = {}
+AST_CACHE_SIZE = 4096
+
+EVAL_GLOBALS: Dict[str, Any] = {'__builtins__': {}}
+
+_MISSING = object()
+
+JIT_WARMUP_PROGRAM = '''
+동네 힘센 사람 n 북딱
+n 마 매끼나라 고마 0 북딱
+흔들어라 warm(a, b) 북딱
+  a 마 매끼나라 고마 a * 2 + b % 3 북딱
+  돌아가 a 북딱
+끝 흔들어라 북딱
+반복 (n < 20) 북딱
+  n 마 매끼나라 고마 n + 1 북딱
+  만약 (n % 2 == 0 and n > 0) 북딱
+    함수 호출 warm(n, 1) 북딱
+  아니면 북딱
+    응디 n 북딱
+  끝 만약 북딱
+끝 반복 북딱
+반복문 k in [1, 2, 3] 북딱
+  넘어가 북딱
+끝 반복문 북딱
+'''
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 file_handler = logging.FileHandler("interpreter.log", encoding='utf-8')
@@ -31,26 +71,80 @@ formatter = logging.Formatter('%(asctime)s - %(message)s')
 file_handler.setFormatter(formatter)
 logging.getLogger().addHandler(file_handler)
 
+_COMMENT_RE = re.compile(r"""(?:[^'"#]+|'[^']*'?|"[^"]*"?)*""")
+
+_JSON_KEY_RE = re.compile(r'([{,]\s*)([A-Za-z0-9_가-힣]+)(\s*:)', re.UNICODE)
+
+_PATTERN_HELP = re.compile(r'도움말 북딱')
+_PATTERN_PRINT = re.compile(r'노무현이 왔습니다 "(.*?)" 북딱')
+_PATTERN_DECLARE = re.compile(r'동네 힘센 사람 ([^ ]+) 북딱')
+_PATTERN_ASSIGN = re.compile(r'([^ ]+) 마 매끼나라 고마 (.*?) 북딱')
+_PATTERN_READFILE = re.compile(r'방독면 챙기십쇼 "(.*?)" 북딱')
+_PATTERN_INPUT = re.compile(r'지금까지 뭐했노 "(.*?)" 북딱')
+_PATTERN_OUTPUT = re.compile(r'응디 ([^ ]+) 북딱')
+_PATTERN_LIST_VARS = re.compile(r'변수 목록 북딱')
+_PATTERN_DELETE_VAR = re.compile(r'변수 삭제 ([^ ]+) 북딱')
+_PATTERN_BREAK = re.compile(r'브레이크 북딱')
+_PATTERN_CONTINUE = re.compile(r'넘어가 북딱')
+_PATTERN_IF = re.compile(r'만약 \((.*?)\) 북딱')
+_PATTERN_ELSE = re.compile(r'아니면 북딱')
+_PATTERN_END_IF = re.compile(r'끝 만약 북딱')
+_PATTERN_WHILE = re.compile(r'반복 \((.*?)\) 북딱')
+_PATTERN_END_WHILE = re.compile(r'끝 반복 북딱')
+_PATTERN_FOR = re.compile(r'반복문 ([^ ]+) in (.*?) 북딱')
+_PATTERN_END_FOR = re.compile(r'끝 반복문 북딱')
+_PATTERN_FUNC_DEF = re.compile(r'흔들어라 ([^ ]+)\s*\((.*?)\) 북딱')
+_PATTERN_END_FUNC = re.compile(r'끝 흔들어라 북딱')
+_PATTERN_FUNC_CALL = re.compile(r'함수 호출 ([^ ]+)\s*\((.*?)\) 북딱')
+_PATTERN_RETURN = re.compile(r'돌아가(?: (.*?))? 북딱')
+
+# str.splitlines가 줄 끝으로 보는 문자들입니다.
+_LINE_BREAKS = '\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029'
+
+_CODE_LINE_RE = re.compile(r"""((?:[^'"#{0}]+|'[^'{0}]*'?|"[^"{0}]*"?)*)[^{0}]*(?:\r\n|[{0}])""".format(_LINE_BREAKS))
+
+# (주석이 제거된 줄, 분류된 패턴, 핸들러, match) - Interpreter.tokenize가 만듭니다.
+LineToken = Tuple[str, Optional[re.Pattern], Optional[Callable], Any]
+
 def remove_comments(line: str) -> str:
     """
     문자열 내에서 # 문자가 나타나면 주석으로 간주하여 제거합니다.
-    단, 문자열 리터럴 내부의 '#'는 유지합니다.
+    단, 문자열 리터럴 내부의 '#'는 유지합니다. 닫히지 않은 따옴표는 줄 끝까지 문자열로 봅니다.
+    """
+    return _COMMENT_RE.match(line).group().strip()
+
+def split_code_lines(program: str) -> List[str]:
     """
-    in_single = False
-    in_double = False
-    result = []
-    i = 0
-    while i < len(line):
-        ch = line[i]
-        if ch == "'" and not in_double:
-            in_single = not in_single
-        elif ch == '"' and not in_single:
-            in_double = not in_double
-        elif ch == '#' and not in_single and not in_double:
-            break
-        result.append(ch)
-        i += 1
-    return "".join(result).strip()
+    program을 줄로 나누면서 각 줄의 주석과 양끝 공백을 제거합니다.
+    splitlines() 후 줄마다 remove_comments를 부른 결과와 같지만, 프로그램 전체를 정규식으로 한 번만 훑습니다.
+    """
+    if program and program[-1] not in _LINE_BREAKS:
+        program += '\n'
+    return [code.strip() for code in _CODE_LINE_RE.findall(program)]
+
+def _has_non_finite(obj: Any) -> bool:
+    """obj(딕셔너리의 키 포함, 리스트/튜플 안쪽까지)에 inf나 nan 실수가 있는지 검사합니다."""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(k) or _has_non_finite(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(v) for v in obj)
+    return False
+
+def dump_json_bytes(obj: Any) -> bytes:
+    """
+    obj를 UTF-8 JSON 바이트열로 한 번에 직렬화합니다.
+    orjson이 있으면 사용하되, orjson은 inf/nan을 오류 없이 null로 바꿔 쓰므로 그런 값이 있으면
+    json 모듈로 Infinity/NaN을 그대로 기록합니다. orjson이 TypeError를 내는 값(64비트를 넘는 정수 등)도
+    json 모듈로 처리합니다.
+    """
+    if orjson is not None and not _has_non_finite(obj):
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=str).encode('utf-8')
 
 allowed_operators: Dict[Any, Any] = {
     ast.Add: op.add,
@@ -76,37 +170,134 @@ allowed_compare_ops: Dict[Any, Any] = {
     ast.GtE: op.ge,
 }
 
-def safe_eval(expression: str, variables: Dict[str, Any]) -> Any:
+_last_eval_globals: Tuple[Optional[Dict[str, Any]], Dict[str, Any]] = (None, EVAL_GLOBALS)
+
+def _eval_globals_for(builtins: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    builtins에 '__builtins__': {}를 더해 eval에 넘길 globals를 만듭니다.
+    인터프리터의 내장 함수 딕셔너리는 만든 뒤 바뀌지 않으므로, 마지막으로 받은 builtins 객체의 결과를 재사용합니다.
+    """
+    global _last_eval_globals
+    cached_builtins, eval_globals = _last_eval_globals
+    if builtins is not cached_builtins:
+        eval_globals = EVAL_GLOBALS if builtins is None else dict(builtins, __builtins__={})
+        _last_eval_globals = (builtins, eval_globals)
+    return eval_globals
+
+def safe_eval(expression: Any, variables: Dict[str, Any],
+              builtins: Optional[Dict[str, Any]] = None) -> Any:
     """
     AST를 이용해 expression을 안전하게 평가합니다.
-    AST 캐싱을 통해 성능을 최적화합니다.
+    허용된 구성요소만으로 이루어진 수식은 코드 객체로 컴파일해 캐싱하고 eval로 평가합니다.
+    평가에 실패하거나 값이 없는 변수가 있으면 _eval_node로 다시 평가하여 같은 오류를 냅니다.
+    variables에 없는 이름은 builtins(내장 함수)에서 찾습니다. eval의 globals는 _eval_globals_for가
+    builtins에서 만들며, 그 안의 '__builtins__'는 이름으로 찾을 수 없습니다.
+    expression은 문자열이거나 compile_expression이 미리 파싱한 결과입니다.
     """
-    expr_key = expression.strip()
     try:
-        if expr_key in AST_CACHE:
-            tree = AST_CACHE[expr_key]
-        else:
-            tree = ast.parse(expression, mode='eval')
-            AST_CACHE[expr_key] = tree
-        return _eval_node(tree.body, variables)
+        if isinstance(expression, str):
+            expression = _parse_expression(expression.strip())
+        tree, code, names = expression
+        if code is not None and all(variables.get(name, builtins.get(name) if builtins else None) is not None for name in names):
+            try:
+                return eval(code, _eval_globals_for(builtins), variables)
+            except Exception:
+                pass
+        return _eval_node(tree.body, ChainMap(variables, builtins or {}))
     except Exception as e:
         raise ValueError(f"안전하지 않은 표현식: {e}")
 
+def compile_expression(expression: str) -> Any:
+    """
+    expression을 미리 파싱해 safe_eval에 그대로 넘길 수 있는 (AST, 코드 객체, 이름) 튜플로 반환합니다.
+    파싱할 수 없으면 문자열을 그대로 반환하여, 평가할 때 safe_eval이 기존과 같은 오류를 내도록 합니다.
+    """
+    try:
+        return _parse_expression(expression.strip())
+    except Exception:
+        return expression
+
+@lru_cache(maxsize=AST_CACHE_SIZE)
+def _parse_expression(expr_key: str) -> Tuple[ast.Expression, Any, Tuple[str, ...]]:
+    """수식 문자열을 AST와 코드 객체로 변환합니다. 최근에 쓰인 AST_CACHE_SIZE개까지 캐싱합니다."""
+    tree = ast.parse(expr_key, mode='eval')
+    code, names = _compile_expression(tree)
+    return tree, code, names
+
+class _BoolOpToBool(ast.NodeTransformer):
+    """and/or 결과를 _eval_node의 all()/any()처럼 bool로 만들기 위해 not not (...)으로 감쌉니다."""
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        self.generic_visit(node)
+        inner = ast.UnaryOp(op=ast.Not(), operand=node)
+        return ast.copy_location(ast.UnaryOp(op=ast.Not(), operand=inner), node)
+
+def _compile_expression(tree: ast.Expression) -> Tuple[Any, Tuple[str, ...]]:
+    """
+    _eval_node가 허용하는 구성요소만으로 이루어진 수식을 코드 객체로 컴파일합니다.
+    다른 구성요소가 있으면 (None, ())을 반환하여 _eval_node가 오류를 내도록 합니다.
+    """
+    names: List[str] = []
+    if not _is_allowed_node(tree.body, names):
+        return None, ()
+    compiled_tree = ast.fix_missing_locations(_BoolOpToBool().visit(copy.deepcopy(tree)))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        code = compile(compiled_tree, '<noh>', 'eval')
+    return code, tuple(dict.fromkeys(names))
+
+def _is_allowed_node(node: ast.AST, names: List[str]) -> bool:
+    if isinstance(node, ast.Constant):
+        return True
+    elif isinstance(node, ast.Name):
+        names.append(node.id)
+        return True
+    elif isinstance(node, ast.BinOp):
+        return (type(node.op) in allowed_operators
+                and _is_allowed_node(node.left, names)
+                and _is_allowed_node(node.right, names))
+    elif isinstance(node, ast.UnaryOp):
+        return type(node.op) in allowed_unary_operators and _is_allowed_node(node.operand, names)
+    elif isinstance(node, ast.BoolOp):
+        return all(_is_allowed_node(v, names) for v in node.values)
+    elif isinstance(node, ast.Compare):
+        return (all(type(op_node) in allowed_compare_ops for op_node in node.ops)
+                and _is_allowed_node(node.left, names)
+                and all(_is_allowed_node(c, names) for c in node.comparators))
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        return all(_is_allowed_node(e, names) for e in node.elts)
+    elif isinstance(node, ast.Dict):
+        return all(k is not None and _is_allowed_node(k, names) and _is_allowed_node(v, names)
+                   for k, v in zip(node.keys, node.values))
+    elif isinstance(node, ast.Subscript):
+        return not isinstance(node.slice, ast.Slice) and _is_allowed_node(node.value, names) \
+            and _is_allowed_node(node.slice, names)
+    return False
+
 def _eval_node(node: ast.AST, variables: Dict[str, Any]) -> Any:
+    """
+    AST 노드를 직접 평가합니다. 연산자 함수는 처음 찾을 때 노드의 _op_fn에 기록해 두고,
+    캐시된 트리를 다시 평가할 때는 그대로 사용합니다.
+    """
     if isinstance(node, ast.Constant):
         return node.value
     elif isinstance(node, ast.BinOp):
         left = _eval_node(node.left, variables)
         right = _eval_node(node.right, variables)
-        operator_func = allowed_operators.get(type(node.op))
+        operator_func = getattr(node, '_op_fn', None)
         if operator_func is None:
-            raise ValueError(f"지원되지 않는 이항 연산자: {node.op}")
+            operator_func = allowed_operators.get(type(node.op))
+            if operator_func is None:
+                raise ValueError(f"지원되지 않는 이항 연산자: {node.op}")
+            node._op_fn = operator_func
         return operator_func(left, right)
     elif isinstance(node, ast.UnaryOp):
         operand = _eval_node(node.operand, variables)
-        operator_func = allowed_unary_operators.get(type(node.op))
+        operator_func = getattr(node, '_op_fn', None)
         if operator_func is None:
-            raise ValueError(f"지원되지 않는 단항 연산자: {node.op}")
+            operator_func = allowed_unary_operators.get(type(node.op))
+            if operator_func is None:
+                raise ValueError(f"지원되지 않는 단항 연산자: {node.op}")
+            node._op_fn = operator_func
         return operator_func(operand)
     elif isinstance(node, ast.BoolOp):
         if isinstance(node.op, ast.And):
@@ -117,9 +308,12 @@ def _eval_node(node: ast.AST, variables: Dict[str, Any]) -> Any:
             raise ValueError(f"지원되지 않는 불린 연산자: {node.op}")
     elif isinstance(node, ast.Compare):
         left = _eval_node(node.left, variables)
-        for op_node, comparator in zip(node.ops, node.comparators):
+        operator_funcs = getattr(node, '_op_fn', None)
+        if operator_funcs is None:
+            operator_funcs = tuple(allowed_compare_ops.get(type(op_node)) for op_node in node.ops)
+            node._op_fn = operator_funcs
+        for op_node, operator_func, comparator in zip(node.ops, operator_funcs, node.comparators):
             comp = _eval_node(comparator, variables)
-            operator_func = allowed_compare_ops.get(type(op_node))
             if operator_func is None:
                 raise ValueError(f"지원되지 않는 비교 연산자: {op_node}")
             if not operator_func(left, comp):
@@ -150,46 +344,201 @@ def _eval_node(node: ast.AST, variables: Dict[str, Any]) -> Any:
     else:
         raise TypeError(f"지원되지 않는 표현식 구성요소: {node}")
 
-class BreakException(Exception):
-    pass
+class Status(IntEnum):
+    """
+    노드 실행 결과입니다. 브레이크/넘어가/돌아가는 예외 대신 이 값을 반환해 바깥 블록으로 전달합니다.
+    NORMAL만 거짓이므로 `if status:`로 흐름이 바뀌었는지 검사할 수 있습니다.
+    """
+    NORMAL = 0
+    BREAK = 1
+    CONTINUE = 2
+    RETURN = 3
+
+class Node:
+    """
+    parse_program이 만드는 실행 단위입니다.
+    line_no는 자신이 속한 블록(프로그램 또는 함수 본문) 안에서의 줄 번호(1부터)입니다.
+    execute는 Status를 반환하며, 일반 명령어 핸들러처럼 None을 반환하면 NORMAL로 봅니다.
+    """
+    def __init__(self, line_no: int):
+        self.line_no = line_no
 
-class ContinueException(Exception):
-    pass
+    def execute(self, interpreter: "Interpreter") -> Optional[Status]:
+        raise NotImplementedError
 
-class ReturnException(Exception):
-    def __init__(self, value: Any):
-        self.value = value
+class RawNode(Node):
+    """
+    제어 블록이 아닌 한 줄입니다. 핸들러와 match를 파싱할 때 미리 구해 둡니다.
+    handler가 None이면 알 수 없는 명령어이며, 실행할 때 dispatch_line이 오류를 냅니다.
+    """
+    def __init__(self, line_no: int, line: str, handler: Optional[Callable], match: Any):
+        super().__init__(line_no)
+        self.line = line
+        self.handler = handler
+        self.match = match
+
+    def execute(self, interpreter: "Interpreter") -> Optional[Status]:
+        if self.handler is None:
+            interpreter.dispatch_line(self.line)
+            return Status.NORMAL
+        return self.handler(interpreter, self.match, self.line)
+
+class IfNode(Node):
+    def __init__(self, line_no: int, condition_expr: str, if_body: List[Node], else_body: List[Node]):
+        super().__init__(line_no)
+        self.condition = compile_expression(condition_expr)
+        self.if_body = if_body
+        self.else_body = else_body
+
+    def execute(self, interpreter: "Interpreter") -> Status:
+        condition_value = interpreter.evaluate_expression(self.condition)
+        interpreter.push_scope()
+        status = interpreter.execute_nodes(self.if_body if condition_value else self.else_body)
+        interpreter.pop_scope()
+        return status
+
+class WhileNode(Node):
+    def __init__(self, line_no: int, condition_expr: str, body: List[Node]):
+        super().__init__(line_no)
+        self.condition = compile_expression(condition_expr)
+        self.body = body
+
+    def execute(self, interpreter: "Interpreter") -> Status:
+        while interpreter.evaluate_expression(self.condition):
+            interpreter.push_scope()
+            status = interpreter.execute_nodes(self.body)
+            interpreter.pop_scope()
+            if status is Status.BREAK:
+                break
+            if status is Status.RETURN:
+                return status
+        return Status.NORMAL
+
+class ForNode(Node):
+    def __init__(self, line_no: int, iter_var: str, iterable_expr: str, body: List[Node]):
+        super().__init__(line_no)
+        self.iter_var = iter_var
+        self.iterable = compile_expression(iterable_expr)
+        self.body = body
+
+    def execute(self, interpreter: "Interpreter") -> Status:
+        iterable_value = interpreter.evaluate_expression(self.iterable)
+        if not hasattr(iterable_value, '__iter__'):
+            interpreter.eungdi("오류: for문 대상이 반복 가능하지 않음", error=True)
+            return Status.NORMAL
+        iter_var, body = self.iter_var, self.body
+        variables, frames = interpreter.vars, interpreter.undo_stack
+        execute_nodes, pop_scope = interpreter.execute_nodes, interpreter.pop_scope
+        for item in iterable_value:
+            # push_scope, declare_variable, assign_variable을 새 프레임에 한 번에 적용합니다.
+            frames.append({iter_var: variables.get(iter_var, _MISSING)})
+            variables[iter_var] = item
+            status = execute_nodes(body)
+            pop_scope()
+            if status is Status.BREAK:
+                break
+            if status is Status.RETURN:
+                return status
+        return Status.NORMAL
+
+class FuncDefNode(Node):
+    def __init__(self, line_no: int, func_name: str, params: List[str], body: List[Node]):
+        super().__init__(line_no)
+        self.func_name = func_name
+        self.params = params
+        self.body = body
+
+    def execute(self, interpreter: "Interpreter") -> None:
+        closure = dict(interpreter.vars)
+        func_obj = Function(self.params, self.body, closure)
+        interpreter.declare_variable(self.func_name)
+        interpreter.assign_variable(self.func_name, func_obj)
+
+def _restore_frame(variables: Dict[str, Any], frame: Dict[str, Any]) -> None:
+    """frame에 기록된 이전 값으로 variables를 되돌립니다. 이전 값이 _MISSING이면 이름을 지웁니다."""
+    for name, prev in frame.items():
+        if prev is _MISSING:
+            del variables[name]
+        else:
+            variables[name] = prev
 
 class Function:
-    def __init__(self, params: List[str], block: List[str], closure: List[Dict[str, Any]]):
+    """
+    body는 함수 정의를 파싱할 때 한 번 만든 노드 목록이며, 호출할 때마다 그대로 실행합니다.
+    """
+    def __init__(self, params: List[str], body: List[Node], closure: Dict[str, Any]):
         self.params = params
-        self.block = block
-        self.closure = closure.copy()
+        self.body = body
+        self.closure = closure
+        self._active_frames: Optional[List[Dict[str, Any]]] = None
 
     def __str__(self):
         return f"Function({', '.join(self.params)})"
 
-    def call(self, interpreter: "Interpreter", args: List[Any]) -> Any:
+    def invoke(self, interpreter: "Interpreter", args: List[Any]) -> Tuple[Status, Any]:
+        """
+        함수를 실행하고 (Status, 반환값)을 반환합니다. 돌아가는 여기서 NORMAL로 바뀌며,
+        본문의 반복문 밖에서 만난 브레이크/넘어가는 호출한 쪽의 반복문에 전달되도록 그대로 반환합니다.
+        """
         if len(args) != len(self.params):
             interpreter.eungdi(
                 f"오류: 함수 호출 인자 개수 불일치. 기대: {len(self.params)}, 전달: {len(args)}",
                 error=True)
-            return None
+            return Status.NORMAL, None
         if interpreter.debug:
-            interpreter.eungdi(f"[DEBUG] 함수 {self} 호출 시작, 인자: {args}")
-        old_scopes = interpreter.scopes
-        interpreter.scopes = self.closure + [{}]
-        for p, arg in zip(self.params, args):
-            interpreter.current_scope()[p] = arg
+            interpreter.eungdi("[DEBUG] 함수 %s 호출 시작, 인자: %s", self, args)
+        closure = self.closure
+        suspended = self._suspend()
+        frame: Dict[str, Any] = {}
+        for name, value in zip(self.params, args):
+            if name not in frame:
+                frame[name] = closure.get(name, _MISSING)
+            closure[name] = value
+        frames = [{}, frame]
+        old_vars, old_frames = interpreter.vars, interpreter.undo_stack
+        interpreter.vars, interpreter.undo_stack = closure, frames
+        self._active_frames = frames
         ret_value = None
         try:
-            interpreter.execute_lines(self.block, 0)
-        except ReturnException as ret_ex:
-            ret_value = ret_ex.value
-        interpreter.scopes = old_scopes
+            status = interpreter.execute_nodes(self.body)
+            if status is Status.RETURN:
+                ret_value, interpreter.return_value = interpreter.return_value, None
+                status = Status.NORMAL
+        finally:
+            for f in reversed(frames):
+                _restore_frame(closure, f)
+            interpreter.vars, interpreter.undo_stack = old_vars, old_frames
+            self._resume(suspended)
         if interpreter.debug:
-            interpreter.eungdi(f"[DEBUG] 함수 {self} 호출 종료, 반환값: {ret_value}")
-        return ret_value
+            interpreter.eungdi("[DEBUG] 함수 %s 호출 종료, 반환값: %s", self, ret_value)
+        return status, ret_value
+
+    def _suspend(self) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """
+        재귀 호출처럼 이 함수가 이미 실행 중이면, 그 호출의 지역 변수를 closure에서 잠시 걷어내고
+        (프레임 목록, 프레임별 지역 변수 값)을 반환합니다. 실행 중이 아니면 None을 반환합니다.
+        """
+        frames = self._active_frames
+        if frames is None:
+            return None
+        values: List[Dict[str, Any]] = []
+        for frame in reversed(frames):
+            values.append({name: self.closure[name] for name in frame})
+            _restore_frame(self.closure, frame)
+        values.reverse()
+        return frames, values
+
+    def _resume(self, suspended: Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]) -> None:
+        """_suspend로 걷어낸 지역 변수를 다시 closure에 올립니다. 그 사이 바뀐 closure 값을 이전 값으로 기록합니다."""
+        if suspended is None:
+            self._active_frames = None
+            return
+        frames, values = suspended
+        for frame, frame_values in zip(frames, values):
+            for name in frame:
+                frame[name] = self.closure.get(name, _MISSING)
+                self.closure[name] = frame_values[name]
+        self._active_frames = frames
 
 class Interpreter:
     """
@@ -215,19 +564,31 @@ class Interpreter:
           • **추가된 시스템 명령**: 화면 지우기, 현재 경로 출력, 작업 디렉터리 변경
     """
     VERSION = "1.1"
+    # (명령어 표, 명령어 기본 표, 파서 표, 파서 기본 표)입니다. 패턴과 핸들러는 인스턴스와 무관하므로
+    # 처음 만든 인스턴스의 single_commands로 클래스마다 한 번만 만듭니다.
+    _dispatch_tables: Optional[Tuple[Any, Any, Any, Any]] = None
+    # 콘솔이 ANSI 이스케이프 시퀀스를 처리하는지 여부입니다. _enable_ansi가 처음 호출될 때 정해집니다.
+    _ansi_enabled: Optional[bool] = None
 
     def __init__(self, debug: bool = False, fast: bool = False):
-        self.scopes: List[Dict[str, Any]] = [{}]
+        self.vars: Dict[str, Any] = {}
+        self.undo_stack: List[Dict[str, Any]] = [{}]
+        self._session: Optional[requests.Session] = None
         self.current_line: Optional[int] = None
+        # 돌아가가 Status.RETURN과 함께 넘기는 값입니다. Function.invoke가 받아 간 뒤 None으로 되돌립니다.
+        self.return_value: Any = None
         self.debug = debug
         self.fast = fast
         self.input_buffer: List[str] = []
         self.prompt = ">> "
+        self._is_pypy = platform.python_implementation() == "PyPy"
+        self._jit_warmup_iters = 200
+        self._jit_warmed = False
 
         if self.fast:
             logging.getLogger().setLevel(logging.ERROR)
 
-        self.scopes[0].update({
+        self._builtins: Dict[str, Any] = {
             'sqrt': math.sqrt,
             'sin': math.sin,
             'cos': math.cos,
@@ -245,30 +606,30 @@ class Interpreter:
             '현재날짜': lambda: datetime.datetime.now().strftime("%Y-%m-%d"),
             'JSON변환': json.loads,
             'JSON문자열화': json.dumps,
-        })
-
-        self.pattern_help = re.compile(r'도움말 북딱')
-        self.pattern_print = re.compile(r'노무현이 왔습니다 "(.*?)" 북딱')
-        self.pattern_declare = re.compile(r'동네 힘센 사람 ([^ ]+) 북딱')
-        self.pattern_assign = re.compile(r'([^ ]+) 마 매끼나라 고마 (.*?) 북딱')
-        self.pattern_readfile = re.compile(r'방독면 챙기십쇼 "(.*?)" 북딱')
-        self.pattern_input = re.compile(r'지금까지 뭐했노 "(.*?)" 북딱')
-        self.pattern_output = re.compile(r'응디 ([^ ]+) 북딱')
-        self.pattern_list_vars = re.compile(r'변수 목록 북딱')
-        self.pattern_delete_var = re.compile(r'변수 삭제 ([^ ]+) 북딱')
-        self.pattern_break = re.compile(r'브레이크 북딱')
-        self.pattern_continue = re.compile(r'넘어가 북딱')
-        self.pattern_if = re.compile(r'만약 \((.*?)\) 북딱')
-        self.pattern_else = re.compile(r'아니면 북딱')
-        self.pattern_end_if = re.compile(r'끝 만약 북딱')
-        self.pattern_while = re.compile(r'반복 \((.*?)\) 북딱')
-        self.pattern_end_while = re.compile(r'끝 반복 북딱')
-        self.pattern_for = re.compile(r'반복문 ([^ ]+) in (.*?) 북딱')
-        self.pattern_end_for = re.compile(r'끝 반복문 북딱')
-        self.pattern_func_def = re.compile(r'흔들어라 ([^ ]+)\s*\((.*?)\) 북딱')
-        self.pattern_end_func = re.compile(r'끝 흔들어라 북딱')
-        self.pattern_func_call = re.compile(r'함수 호출 ([^ ]+)\s*\((.*?)\) 북딱')
-        self.pattern_return = re.compile(r'돌아가(?: (.*?))? 북딱')
+        }
+
+        self.pattern_help = _PATTERN_HELP
+        self.pattern_print = _PATTERN_PRINT
+        self.pattern_declare = _PATTERN_DECLARE
+        self.pattern_assign = _PATTERN_ASSIGN
+        self.pattern_readfile = _PATTERN_READFILE
+        self.pattern_input = _PATTERN_INPUT
+        self.pattern_output = _PATTERN_OUTPUT
+        self.pattern_list_vars = _PATTERN_LIST_VARS
+        self.pattern_delete_var = _PATTERN_DELETE_VAR
+        self.pattern_break = _PATTERN_BREAK
+        self.pattern_continue = _PATTERN_CONTINUE
+        self.pattern_if = _PATTERN_IF
+        self.pattern_else = _PATTERN_ELSE
+        self.pattern_end_if = _PATTERN_END_IF
+        self.pattern_while = _PATTERN_WHILE
+        self.pattern_end_while = _PATTERN_END_WHILE
+        self.pattern_for = _PATTERN_FOR
+        self.pattern_end_for = _PATTERN_END_FOR
+        self.pattern_func_def = _PATTERN_FUNC_DEF
+        self.pattern_end_func = _PATTERN_END_FUNC
+        self.pattern_func_call = _PATTERN_FUNC_CALL
+        self.pattern_return = _PATTERN_RETURN
         
         self.single_commands = [
             (self.pattern_help, self.handle_help),
@@ -318,64 +679,144 @@ class Interpreter:
             (re.compile(r'현재 경로 출력 북딱'), self.handle_cwd_print),
             (re.compile(r'작업 디렉터리 변경 "(.*?)" 북딱'), self.handle_change_directory),
         ]
-
-    def current_scope(self) -> Dict[str, Any]:
-        return self.scopes[-1]
+        # 파서가 한 줄을 한 번의 정규식 매칭으로 분류하도록 제어문 패턴을 명령어 앞에 둡니다.
+        # 블록 끝/시작 패턴의 핸들러는 None이며, 블록 시작은 _block_parsers가 처리합니다.
+        self.control_commands: List[Tuple[re.Pattern, Optional[Callable]]] = [
+            (self.pattern_end_if, None),
+            (self.pattern_else, None),
+            (self.pattern_end_while, None),
+            (self.pattern_end_for, None),
+            (self.pattern_end_func, None),
+            (self.pattern_if, None),
+            (self.pattern_while, None),
+            (self.pattern_for, None),
+            (self.pattern_func_def, None),
+            (self.pattern_func_call, Interpreter.handle_func_call),
+            (self.pattern_break, Interpreter.handle_break),
+            (self.pattern_continue, Interpreter.handle_continue),
+            (self.pattern_return, Interpreter.handle_return),
+        ]
+        self._block_parsers: Dict[re.Pattern, Callable] = {
+            self.pattern_if: self._parse_if,
+            self.pattern_while: self._parse_while,
+            self.pattern_for: self._parse_for,
+            self.pattern_func_def: self._parse_func_def,
+        }
+        tables = type(self).__dict__.get('_dispatch_tables')
+        if tables is None:
+            commands = [(pattern, handler.__func__) for pattern, handler in self.single_commands]
+            tables = self._build_dispatch(commands) + self._build_dispatch(self.control_commands + commands)
+            type(self)._dispatch_tables = tables
+        self._by_keyword, self._dispatch_fallback, self._parse_by_keyword, self._parse_fallback = tables
+
+    @classmethod
+    def _build_dispatch(cls, commands: List[Tuple[re.Pattern, Optional[Callable]]]) -> Tuple[Dict[str, Any], Any]:
+        """
+        commands를 첫 단어(키워드)별로 묶어 키워드마다 하나의 정규식으로 합칩니다.
+        첫 단어가 고정 문자열이 아닌 패턴(예: 할당)은 모든 키워드 후보에 원래 순서대로 포함됩니다.
+        키워드마다 (합친 정규식, 패턴 튜플, 핸들러 튜플)을 만들며, 두 튜플은 합친 정규식의
+        그룹 번호(match.lastindex)로 바로 인덱싱합니다. (키워드별 표, 키워드가 없을 때의 표)를 반환합니다.
+        핸들러는 인터프리터에 묶지 않은 함수여야 합니다.
+        """
+        keyed: Dict[str, List[int]] = {}
+        residual: List[int] = []
+        for i, (pattern, _) in enumerate(commands):
+            head = pattern.pattern.partition(' ')[0]
+            if head and re.escape(head) == head:
+                keyed.setdefault(head, []).append(i)
+            else:
+                residual.append(i)
+        by_keyword: Dict[str, Tuple[re.Pattern, Tuple[re.Pattern, ...], Tuple[Callable, ...]]] = {
+            keyword: cls._compile_dispatch([commands[i] for i in sorted(indices + residual)])
+            for keyword, indices in keyed.items()
+        }
+        return by_keyword, cls._compile_dispatch([commands[i] for i in residual])
+
+    @staticmethod
+    def _compile_dispatch(commands: List[Tuple[re.Pattern, Optional[Callable]]]
+                          ) -> Tuple[re.Pattern, Tuple[re.Pattern, ...], Tuple[Callable, ...]]:
+        combined = re.compile("|".join(f"({pattern.pattern})" for pattern, _ in commands))
+        patterns: List[Optional[re.Pattern]] = [None] * (combined.groups + 1)
+        handlers: List[Optional[Callable]] = [None] * (combined.groups + 1)
+        group = 1
+        for pattern, handler in commands:
+            patterns[group] = pattern
+            handlers[group] = handler
+            group += pattern.groups + 1
+        return combined, tuple(patterns), tuple(handlers)
 
     def push_scope(self) -> None:
-        self.scopes.append({})
+        self.undo_stack.append({})
 
     def pop_scope(self) -> None:
-        if len(self.scopes) > 1:
-            self.scopes.pop()
+        if len(self.undo_stack) > 1:
+            _restore_frame(self.vars, self.undo_stack.pop())
         else:
             self.eungdi("오류: 전역 스코프는 제거할 수 없습니다.", error=True)
 
     def get_combined_scope(self) -> Dict[str, Any]:
-        return ChainMap(*self.scopes[::-1])
+        return ChainMap(self.vars, self._builtins)
 
     def declare_variable(self, var_name: str) -> None:
-        if var_name in self.current_scope():
+        """
+        현재 스코프에 var_name을 선언합니다. 변수는 하나의 평면 딕셔너리(vars)에 두고,
+        스코프마다 undo_stack 프레임에 가려진 이전 값을 기록해 두었다가 pop_scope에서 되돌립니다.
+        """
+        frame = self.undo_stack[-1]
+        if var_name in frame:
             self.eungdi(f'오류: 변수 "{var_name}" 가 이미 선언됨', error=True)
         else:
-            self.current_scope()[var_name] = None
+            frame[var_name] = self.vars.get(var_name, _MISSING)
+            self.vars[var_name] = None
 
     def assign_variable(self, var_name: str, value: Any) -> None:
-        for scope in reversed(self.scopes):
-            if var_name in scope:
-                scope[var_name] = value
-                return
+        if var_name in self.vars:
+            self.vars[var_name] = value
+            return
         self.eungdi(f'오류: 변수 "{var_name}" 가 선언되지 않음', error=True)
 
     def get_variable(self, var_name: str) -> Any:
-        for scope in reversed(self.scopes):
-            if var_name in scope:
-                return scope[var_name]
+        if var_name in self.vars:
+            return self.vars[var_name]
+        if var_name in self._builtins:
+            return self._builtins[var_name]
         self.eungdi(f'오류: 변수 "{var_name}" 가 선언되지 않음', error=True)
         return None
 
-    def eungdi(self, message: str, error: bool = False) -> None:
-        if self.fast and not error:
+    def _will_print(self, error: bool = False) -> bool:
+        return error or not self.fast
+
+    def eungdi(self, message: str, *args: Any, error: bool = False) -> None:
+        """
+        메시지를 출력합니다. args가 있으면 실제로 출력할 때만 message % args로 포맷합니다.
+        """
+        if not self._will_print(error):
             return
-        if colorama is not None:
-            if error:
-                colored_message = Fore.RED + message + Style.RESET_ALL
-            else:
-                colored_message = Fore.GREEN + message + Style.RESET_ALL
-        else:
-            colored_message = message
-        output = f"Line {self.current_line}: {colored_message}" if self.current_line is not None else colored_message
-        if error:
-            logging.error(output)
-        else:
-            logging.info(output)
-        if self.debug:
-            logging.debug(f"[DEBUG] 스코프: {dict(self.get_combined_scope())}")
+        logger = logging.getLogger()
+        level = logging.ERROR if error else logging.INFO
+        if logger.isEnabledFor(level):
+            if args:
+                message = message % args
+            if colorama is not None:
+                message = (Fore.RED if error else Fore.GREEN) + message + Style.RESET_ALL
+            logger.log(level, f"Line {self.current_line}: {message}" if self.current_line is not None else message)
+        if self.debug and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DEBUG] 스코프: %s", dict(self.get_combined_scope()))
 
     def read_file(self, file_path: str) -> Optional[str]:
+        """
+        파일 전체를 바이트로 한 번에 읽어 UTF-8로 한 번만 디코딩합니다.
+        텍스트 모드와 같도록 CRLF/CR 줄바꿈은 LF로 바꾸되, CR이 있을 때만 바꿉니다.
+        앞뒤 공백도 있을 때만 strip하여 큰 파일의 내용을 한 번 더 복사하지 않습니다.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
+            with open(file_path, 'rb') as file:
+                text = file.read().decode('utf-8')
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            if text and (text[0].isspace() or text[-1].isspace()):
+                text = text.strip()
+            return text
         except FileNotFoundError:
             self.eungdi(f'오류: 파일을 찾을 수 없습니다 - {file_path}', error=True)
         except Exception as e:
@@ -387,9 +828,9 @@ class Interpreter:
             return self.input_buffer.pop(0)
         return input(prompt)
 
-    def evaluate_expression(self, expression: str) -> Any:
+    def evaluate_expression(self, expression: Any) -> Any:
         try:
-            return safe_eval(expression, dict(self.get_combined_scope()))
+            return safe_eval(expression, self.vars, self._builtins)
         except Exception as e:
             self.eungdi(f'오류: 수식 평가 중 문제 발생 - {e}', error=True)
             return None
@@ -476,24 +917,26 @@ class Interpreter:
         self.eungdi(user_input)
 
     def handle_output(self, match, line: str) -> None:
-        self.eungdi(str(self.get_variable(match.group(1))))
+        self.eungdi('%s', self.get_variable(match.group(1)))
 
     def handle_list_vars(self, match, line: str) -> None:
-        combined = dict(self.get_combined_scope())
-        for var, value in sorted(combined.items()):
-            self.eungdi(f'{var} = {value}')
+        if not self._will_print():
+            return
+        for var, value in sorted(self.get_combined_scope().items()):
+            self.eungdi('%s = %s', var, value)
 
     def handle_delete_var(self, match, line: str) -> None:
         var_name = match.group(1)
-        if var_name in self.current_scope():
-            del self.current_scope()[var_name]
+        frame = self.undo_stack[-1]
+        if var_name in frame:
+            _restore_frame(self.vars, {var_name: frame.pop(var_name)})
             self.eungdi(f'변수 "{var_name}" 삭제됨')
         else:
             self.eungdi(f'오류: 변수 "{var_name}" 가 현재 스코프에 없음', error=True)
 
     def handle_state(self, match, line: str) -> None:
-        state = dict(self.get_combined_scope())
-        self.eungdi(f"현재 상태: {state}")
+        if self._will_print():
+            self.eungdi("현재 상태: %s", dict(self.get_combined_scope()))
 
     def handle_version(self, match, line: str) -> None:
         self.eungdi(f"Interpreter version: {self.VERSION}")
@@ -522,10 +965,21 @@ class Interpreter:
     def handle_current_date(self, match, line: str) -> None:
         self.eungdi(datetime.datetime.now().strftime("%Y-%m-%d"))
 
+    def http_session(self) -> requests.Session:
+        """
+        HTTP 요청에 재사용할 세션을 반환합니다. 첫 요청 때 만들고 종료 시 닫습니다.
+        같은 호스트로 보내는 요청은 연결을 재사용합니다(keep-alive).
+        """
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update({'User-Agent': f'NohLang/{self.VERSION}'})
+            atexit.register(self._session.close)
+        return self._session
+
     def handle_http_request(self, match, line: str) -> None:
         url = match.group(1)
         try:
-            response = requests.get(url)
+            response = self.http_session().get(url, timeout=10)
             self.eungdi(f"HTTP 응답 ({response.status_code}): {response.text[:200]}...")
         except Exception as e:
             self.eungdi(f"HTTP 요청 실패: {e}", error=True)
@@ -558,10 +1012,7 @@ class Interpreter:
         1. { 또는 , 뒤에 오는 속성명에 자동으로 큰따옴표를 추가합니다.
         2. 모든 작은따옴표(')를 큰따옴표(")로 변환합니다.
         """
-        json_str = json_str.strip()
-        fixed = re.sub(r'([{,]\s*)([A-Za-z0-9_가-힣]+)(\s*:)', r'\1"\2"\3', json_str, flags=re.UNICODE)
-        fixed = fixed.replace("'", "\"")
-        return fixed.strip()
+        return _JSON_KEY_RE.sub(r'\1"\2"\3', json_str.strip()).replace("'", "\"").strip()
 
 
     def handle_json_dump(self, match, line: str) -> None:
@@ -624,13 +1075,12 @@ class Interpreter:
             self.eungdi(f"오류: 변수 '{var_name}'는 딕셔너리가 아님", error=True)
 
     def handle_reset(self, match, line: str) -> None:
-        builtins = self.scopes[0].copy()
-        self.scopes = [builtins]
+        while len(self.undo_stack) > 1:
+            _restore_frame(self.vars, self.undo_stack.pop())
         self.eungdi("스코프 초기화 완료")
 
     def handle_builtin_list(self, match, line: str) -> None:
-        builtins = self.scopes[0]
-        funcs = {k: v for k, v in builtins.items() if callable(v)}
+        funcs = {k: v for k, v in self._builtins.items() if callable(v)}
         self.eungdi(f"내장 함수 목록: {list(funcs.keys())}")
 
     def handle_system_command(self, match, line: str) -> None:
@@ -752,12 +1202,11 @@ class Interpreter:
 
     def handle_save_vars(self, match, line: str) -> None:
         filename = match.group(1)
-        user_vars = {}
-        for scope in self.scopes[1:]:
-            user_vars.update(scope)
+        user_vars = {name: self.vars[name] for frame in self.undo_stack[1:] for name in frame}
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(user_vars, f, default=str)
+            data = dump_json_bytes(user_vars)
+            with open(filename, "wb") as f:
+                f.write(data)
             self.eungdi(f"변수 저장 완료: {filename}")
         except Exception as e:
             self.eungdi(f"변수 저장 실패: {e}", error=True)
@@ -767,7 +1216,11 @@ class Interpreter:
         try:
             with open(filename, "r", encoding="utf-8") as f:
                 loaded_vars = json.load(f)
-            self.current_scope().update(loaded_vars)
+            frame = self.undo_stack[-1]
+            for name, value in loaded_vars.items():
+                if name not in frame:
+                    frame[name] = self.vars.get(name, _MISSING)
+                self.vars[name] = value
             self.eungdi(f"변수 불러오기 완료: {filename}")
         except Exception as e:
             self.eungdi(f"변수 불러오기 실패: {e}", error=True)
@@ -785,12 +1238,36 @@ class Interpreter:
         cmds = [p.pattern for (p, h) in self.single_commands]
         self.eungdi("지원 명령어 목록:\n" + "\n".join(cmds))
 
+    @classmethod
+    def _enable_ansi(cls) -> bool:
+        """
+        터미널이 ANSI 이스케이프 시퀀스를 처리할 수 있는지 반환합니다. 결과는 클래스에 캐싱합니다.
+        Windows에서는 콘솔의 ENABLE_VIRTUAL_TERMINAL_PROCESSING(0x0004)을 켜 보고, 실패하면 False입니다.
+        """
+        if cls._ansi_enabled is None:
+            if os.name != 'nt':
+                cls._ansi_enabled = True
+            else:
+                try:
+                    import ctypes
+                    kernel32 = ctypes.windll.kernel32
+                    handle = kernel32.GetStdHandle(-11)
+                    mode = ctypes.c_uint32()
+                    cls._ansi_enabled = bool(kernel32.GetConsoleMode(handle, ctypes.byref(mode))
+                                             and kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+                except Exception:
+                    cls._ansi_enabled = False
+        return cls._ansi_enabled
+
     def handle_clear_screen(self, match, line: str) -> None:
         try:
-            if os.name == 'nt':
-                os.system('cls')
-            else:
-                os.system('clear')
+            # 출력이 파일이나 파이프로 리디렉션된 경우에는 지울 화면이 없으므로 아무것도 쓰지 않습니다.
+            if sys.stdout.isatty():
+                if self._enable_ansi():
+                    sys.stdout.write('\x1b[H\x1b[2J\x1b[3J')
+                    sys.stdout.flush()
+                else:
+                    os.system('cls')
             self.eungdi("화면 지우기 완료")
         except Exception as e:
             self.eungdi(f"화면 지우기 실패: {e}", error=True)
@@ -810,232 +1287,212 @@ class Interpreter:
         except Exception as e:
             self.eungdi(f"작업 디렉터리 변경 실패: {e}", error=True)
 
-    def interpret_line(self, line: str) -> None:
-        line = remove_comments(line)
-        if not line:
+    def dispatch_line(self, line: str) -> None:
+        """
+        주석이 제거된 한 줄을 키워드별 정규식으로 찾아 핸들러를 실행합니다.
+        """
+        dispatch_re, patterns, handlers = self._by_keyword.get(line.partition(' ')[0], self._dispatch_fallback)
+        m = dispatch_re.fullmatch(line)
+        if m:
+            i = m.lastindex
+            handlers[i](self, patterns[i].fullmatch(line), line)
             return
-        for pattern, handler in self.single_commands:
-            m = pattern.fullmatch(line)
-            if m:
-                handler(m, line)
-                return
         self.eungdi(f'오류: 알 수 없는 명령어 - {line}', error=True)
 
-    def execute_lines(self, lines: List[str], start_index: int = 0) -> int:
-        i = start_index
-        while i < len(lines):
-            self.current_line = i + 1
-            line = remove_comments(lines[i])
-            if not line:
-                i += 1
-                continue
+    def tokenize(self, program: str) -> List[LineToken]:
+        """
+        프로그램 문자열을 줄 나누기, 주석 제거, 분류까지 한 번에 처리해 LineToken 목록으로 만듭니다.
+        """
+        return self.classify_lines(split_code_lines(program))
 
-            if self.pattern_if.fullmatch(line):
-                i = self.process_if(lines, i)
-                continue
-            if self.pattern_while.fullmatch(line):
-                i = self.process_while(lines, i)
-                continue
-            if self.pattern_for.fullmatch(line):
-                i = self.process_for(lines, i)
-                continue
-            if self.pattern_func_def.fullmatch(line):
-                i = self.process_func_def(lines, i)
-                continue
-            if self.pattern_func_call.fullmatch(line):
-                self.process_func_call(line)
-                i += 1
-                continue
-            if re.fullmatch(r'브레이크 북딱', line):
-                raise BreakException()
-            if re.fullmatch(r'넘어가 북딱', line):
-                raise ContinueException()
-            if self.pattern_return.fullmatch(line):
-                self.process_return(line)
-
-            self.interpret_line(line)
-            i += 1
-        return i
+    def classify_lines(self, lines: List[str]) -> List[LineToken]:
+        """
+        주석이 제거된 줄마다 _classify_line을 한 번 적용합니다. 빈 줄은 분류하지 않습니다.
+        """
+        classify = self._classify_line
+        return [(line,) + classify(line) if line else (line, None, None, None) for line in lines]
 
-    def interpret_program(self, program: str) -> None:
-        lines = program.splitlines()
-        try:
-            self.execute_lines(lines, 0)
-        except Exception as e:
-            self.eungdi(f"실행 중 오류: {e}", error=True)
-        self.current_line = None
+    def parse_program(self, tokens: List[LineToken]) -> List[Node]:
+        """
+        tokenize가 만든 토큰 목록을 한 번 훑어 노드 트리로 만듭니다.
+        블록의 끝(끝 만약/끝 반복/끝 반복문/끝 흔들어라)은 여기서 한 번만 찾으므로,
+        반복문 본문을 실행할 때마다 줄을 다시 훑거나 정규식으로 분류하지 않습니다.
+        """
+        nodes, _, _ = self._parse_block(tokens, 0, 0, ())
+        return nodes
 
-    def process_if(self, lines: List[str], index: int) -> int:
-        line = remove_comments(lines[index])
-        match = self.pattern_if.fullmatch(line)
-        if not match:
-            self.eungdi("오류: if 구문 파싱 실패", error=True)
-            return index + 1
-        condition_expr = match.group(1)
-        condition_value = self.evaluate_expression(condition_expr)
-
-        if_block: List[str] = []
-        else_block: List[str] = []
-        i = index + 1
-        in_else = False
-        nested_if = 0
-        while i < len(lines):
-            curr_line = remove_comments(lines[i])
-            if self.pattern_if.fullmatch(curr_line):
-                nested_if += 1
-            elif self.pattern_end_if.fullmatch(curr_line):
-                if nested_if > 0:
-                    nested_if -= 1
-                else:
-                    break
-            elif self.pattern_else.fullmatch(curr_line) and nested_if == 0:
-                in_else = True
+    def _classify_line(self, line: str) -> Tuple[Optional[re.Pattern], Optional[Callable], Any]:
+        """
+        제어문과 명령어 패턴을 합친 정규식 한 번으로 줄을 분류해 (패턴, 핸들러, match)를 반환합니다.
+        어느 패턴과도 맞지 않으면 (None, None, None)입니다.
+        """
+        dispatch_re, patterns, handlers = self._parse_by_keyword.get(line.partition(' ')[0], self._parse_fallback)
+        m = dispatch_re.fullmatch(line)
+        if m is None:
+            return None, None, None
+        j = m.lastindex
+        pattern = patterns[j]
+        return pattern, handlers[j], pattern.fullmatch(line)
+
+    def _parse_block(self, tokens: List[LineToken], index: int, base: int,
+                     ends: Tuple[re.Pattern, ...]) -> Tuple[List[Node], int, Optional[re.Pattern]]:
+        """
+        tokens[index]부터 ends 중 하나와 일치하는 줄(또는 끝)까지 파싱합니다.
+        (노드 목록, 멈춘 줄의 인덱스, 일치한 ends 패턴 또는 None)을 반환합니다.
+        """
+        nodes: List[Node] = []
+        i = index
+        while i < len(tokens):
+            line, pattern, handler, m = tokens[i]
+            if not line:
                 i += 1
                 continue
-            if not in_else:
-                if_block.append(curr_line)
+            if pattern in ends:
+                return nodes, i, pattern
+            line_no = i - base + 1
+            block_parser = self._block_parsers.get(pattern) if handler is None else None
+            if block_parser is not None:
+                node, i = block_parser(tokens, i, m, line_no)
+                nodes.append(node)
             else:
-                else_block.append(curr_line)
-            i += 1
-
-        self.push_scope()
-        if condition_value:
-            self.execute_lines(if_block, 0)
-        else:
-            self.execute_lines(else_block, 0)
-        self.pop_scope()
-        return i + 1
-
-    def process_while(self, lines: List[str], index: int) -> int:
-        line = remove_comments(lines[index])
-        match = self.pattern_while.fullmatch(line)
-        if not match:
-            self.eungdi("오류: while 구문 파싱 실패", error=True)
-            return index + 1
-        condition_expr = match.group(1)
-        block: List[str] = []
-        i = index + 1
-        nested_while = 0
-        while i < len(lines):
-            curr_line = remove_comments(lines[i])
-            if self.pattern_while.fullmatch(curr_line):
-                nested_while += 1
-            elif self.pattern_end_while.fullmatch(curr_line):
-                if nested_while > 0:
-                    nested_while -= 1
-                else:
-                    break
-            block.append(curr_line)
+                nodes.append(RawNode(line_no, line, handler, m))
             i += 1
-
-        while self.evaluate_expression(condition_expr):
-            self.push_scope()
-            try:
-                self.execute_lines(block, 0)
-            except ContinueException:
-                self.pop_scope()
-                continue
-            except BreakException:
-                self.pop_scope()
-                break
-            self.pop_scope()
-        return i + 1
-
-    def process_for(self, lines: List[str], index: int) -> int:
-        line = remove_comments(lines[index])
-        match = self.pattern_for.fullmatch(line)
-        if not match:
-            self.eungdi("오류: for 구문 파싱 실패", error=True)
-            return index + 1
-        iter_var = match.group(1)
-        iterable_expr = match.group(2)
-        iterable_value = self.evaluate_expression(iterable_expr)
-        if not hasattr(iterable_value, '__iter__'):
-            self.eungdi("오류: for문 대상이 반복 가능하지 않음", error=True)
-            return index + 1
-
-        block: List[str] = []
-        i = index + 1
-        while i < len(lines):
-            curr_line = remove_comments(lines[i])
-            if self.pattern_end_for.fullmatch(curr_line):
-                break
-            block.append(curr_line)
-            i += 1
-
-        for item in iterable_value:
-            self.push_scope()
-            self.declare_variable(iter_var)
-            self.assign_variable(iter_var, item)
-            try:
-                self.execute_lines(block, 0)
-            except ContinueException:
-                self.pop_scope()
-                continue
-            except BreakException:
-                self.pop_scope()
-                break
-            self.pop_scope()
-        return i + 1
-
-    def process_func_def(self, lines: List[str], index: int) -> int:
-        line = remove_comments(lines[index])
-        match = self.pattern_func_def.fullmatch(line)
-        if not match:
-            self.eungdi("오류: 함수 정의 구문 파싱 실패", error=True)
-            return index + 1
-        func_name = match.group(1)
-        params = [p.strip() for p in match.group(2).split(",") if p.strip()]
-        block: List[str] = []
+        return nodes, i, None
+
+    def _parse_if(self, tokens: List[LineToken], index: int, m, line_no: int) -> Tuple[Node, int]:
+        if_ends = (self.pattern_end_if, self.pattern_else)
+        if_body, i, end = self._parse_block(tokens, index + 1, index + 1, if_ends)
+        else_body: List[Node] = []
+        else_base = i + 1
+        while end is self.pattern_else:
+            more, i, end = self._parse_block(tokens, i + 1, else_base, if_ends)
+            else_body.extend(more)
+        return IfNode(line_no, m.group(1), if_body, else_body), i
+
+    def _parse_while(self, tokens: List[LineToken], index: int, m, line_no: int) -> Tuple[Node, int]:
+        body, i, _ = self._parse_block(tokens, index + 1, index + 1, (self.pattern_end_while,))
+        return WhileNode(line_no, m.group(1), body), i
+
+    def _parse_for(self, tokens: List[LineToken], index: int, m, line_no: int) -> Tuple[Node, int]:
+        body, i, _ = self._parse_block(tokens, index + 1, index + 1, (self.pattern_end_for,))
+        return ForNode(line_no, m.group(1), m.group(2), body), i
+
+    def _parse_func_def(self, tokens: List[LineToken], index: int, m, line_no: int) -> Tuple[Node, int]:
+        params = [p.strip() for p in m.group(2).split(",") if p.strip()]
+        end = self._find_func_end(tokens, index)
+        return FuncDefNode(line_no, m.group(1), params, self.parse_program(tokens[index + 1:end])), end
+
+    def _find_func_end(self, tokens: List[LineToken], index: int) -> int:
+        """
+        tokens[index]의 함수 정의를 닫는 '끝 흔들어라' 줄의 인덱스(없으면 len(tokens))를 반환합니다.
+        줄은 이미 분류되어 있으므로 패턴을 다시 매칭하지 않습니다.
+        """
+        func_def, end_func = self.pattern_func_def, self.pattern_end_func
         i = index + 1
         nested_func = 0
-        while i < len(lines):
-            curr_line = remove_comments(lines[i])
-            if self.pattern_func_def.fullmatch(curr_line):
+        while i < len(tokens):
+            pattern = tokens[i][1]
+            if pattern is func_def:
                 nested_func += 1
-            elif self.pattern_end_func.fullmatch(curr_line):
+            elif pattern is end_func:
                 if nested_func > 0:
                     nested_func -= 1
                 else:
                     break
-            block.append(curr_line)
             i += 1
-        closure = copy.deepcopy(self.scopes)
-        func_obj = Function(params, block, closure)
-        self.declare_variable(func_name)
-        self.assign_variable(func_name, func_obj)
-        return i + 1
-
-    def process_func_call(self, line: str) -> None:
-        match = self.pattern_func_call.fullmatch(remove_comments(line))
-        if not match:
-            self.eungdi("오류: 함수 호출 구문 파싱 실패", error=True)
+        return i
+
+    def execute_nodes(self, nodes: List[Node]) -> Status:
+        """
+        nodes를 차례로 실행합니다. 브레이크/넘어가/돌아가를 만나면 남은 노드를 건너뛰고 그 Status를 반환합니다.
+        """
+        for node in nodes:
+            self.current_line = node.line_no
+            status = node.execute(self)
+            if status:
+                return status
+        return Status.NORMAL
+
+    def jit_warmup(self) -> None:
+        """
+        PyPy의 JIT가 디스패치와 수식 평가 경로를 미리 추적하도록 JIT_WARMUP_PROGRAM을 반복 실행합니다.
+        사용자 프로그램은 부작용(파일, HTTP, 시스템 명령)이 있을 수 있으므로 예열에 쓰지 않습니다.
+        """
+        self._jit_warmed = True
+        saved_vars, saved_frames, saved_line = self.vars, self.undo_stack, self.current_line
+        nodes = self.parse_program(self.tokenize(JIT_WARMUP_PROGRAM))
+        for _ in range(self._jit_warmup_iters):
+            self.vars, self.undo_stack = {}, [{}]
+            try:
+                self.execute_nodes(nodes)
+            except Exception:
+                pass
+        self.vars, self.undo_stack, self.current_line = saved_vars, saved_frames, saved_line
+
+    def interpret_program(self, program: str) -> None:
+        if self._is_pypy and self.fast and not self._jit_warmed:
+            self.jit_warmup()
+        try:
+            self.report_stray_status(self.execute_nodes(self.parse_program(self.tokenize(program))))
+        except Exception as e:
+            self.eungdi(f"실행 중 오류: {e}", error=True)
+        self.current_line = None
+
+    def interpret_single_line(self, line: str) -> None:
+        """
+        대화형 모드에서 입력한 한 줄을 실행합니다.
+        줄 나누기와 블록 파싱을 거치지 않고, 한 번 분류한 결과로 바로 실행합니다.
+        """
+        if self._is_pypy and self.fast and not self._jit_warmed:
+            self.jit_warmup()
+        line = remove_comments(line)
+        if not line:
             return
+        pattern, handler, m = self._classify_line(line)
+        if pattern in self._block_parsers:
+            nodes = self.parse_program([(line, pattern, handler, m)])
+        else:
+            nodes = [RawNode(1, line, handler, m)]
+        try:
+            self.report_stray_status(self.execute_nodes(nodes))
+        except Exception as e:
+            self.eungdi(f"실행 중 오류: {e}", error=True)
+        self.current_line = None
+
+    def report_stray_status(self, status: Status) -> None:
+        """
+        반복문이나 함수가 받아 주지 않은 브레이크/넘어가/돌아가를 오류로 출력합니다.
+        실행은 이미 그 줄에서 멈춘 상태입니다.
+        """
+        if status is Status.RETURN:
+            self.return_value = None
+            self.eungdi("오류: 함수 밖에서 돌아가를 사용할 수 없습니다.", error=True)
+        elif status:
+            self.eungdi("오류: 반복문 밖에서 브레이크나 넘어가를 사용할 수 없습니다.", error=True)
+
+    def handle_func_call(self, match, line: str) -> Optional[Status]:
         func_name = match.group(1)
         args_expr = [arg.strip() for arg in match.group(2).split(",") if arg.strip()]
         args_values = [self.evaluate_expression(arg) for arg in args_expr]
         func_obj = self.get_variable(func_name)
         if not isinstance(func_obj, Function):
             self.eungdi(f'오류: "{func_name}" 는 함수가 아님', error=True)
-            return
-        func_obj.call(self, args_values)
+            return Status.NORMAL
+        return func_obj.invoke(self, args_values)[0]
 
-    def process_return(self, line: str) -> None:
-        match = self.pattern_return.fullmatch(remove_comments(line))
-        if not match:
-            self.eungdi("오류: 반환 구문 파싱 실패", error=True)
-            return
+    def handle_break(self, match, line: str) -> Status:
+        return Status.BREAK
+
+    def handle_continue(self, match, line: str) -> Status:
+        return Status.CONTINUE
+
+    def handle_return(self, match, line: str) -> Status:
         expr = match.group(1)
-        ret_val = self.evaluate_expression(expr) if expr else None
-        raise ReturnException(ret_val)
+        self.return_value = self.evaluate_expression(expr) if expr else None
+        return Status.RETURN
 
     def run_repl(self) -> None:
         self.eungdi("대화형 모드입니다. '종료', 'exit' 또는 'quit'을 입력하면 종료합니다.")
-        if sys.stdin.isatty():
-            try:
-                import readline
-            except ImportError:
-                pass
         while True:
             try:
                 line = input(self.prompt)
@@ -1045,7 +1502,7 @@ class Interpreter:
             if line.strip() in ("종료", "exit", "quit"):
                 break
             try:
-                self.interpret_program(line)
+                self.interpret_single_line(line)
             except Exception as e:
                 self.eungdi(f"실행 중 오류: {e}", error=True)
 